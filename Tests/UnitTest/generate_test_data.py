@@ -16,26 +16,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import io
 import os
 import sys
+import glob
 import json
+import hashlib
 import math
 import argparse
 import subprocess
+import multiprocessing
 import numpy as np
 
 from packaging import version
 from abc import ABC, abstractmethod
-
-try:
-    import tensorflow as tf
-except Exception as e:
-    print(e)
-    sys.exit(1)
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 REQUIRED_MINIMUM_TENSORFLOW_VERSION = version.parse("2.10")
 
 CLANG_FORMAT = 'clang-format-12 -i'  # For formatting generated headers.
+CLANG_FORMAT_MAX_FILES = 512  # Files per clang-format call, to stay below the command line length limit.
 
 INT32_MAX = 2147483647
 INT32_MIN = -2147483648
@@ -70,6 +70,12 @@ def parse_args() -> argparse.Namespace:
                         "sets. Regenerate all, partially all or no input data (output may still change, depending on"
                         " changes in script) depending on regenerate flags. If used together with the -t flag, only"
                         " tests of that type will be run.")
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=os.cpu_count(),
+                        help="Number of test sets that are generated in parallel when used together with"
+                        " --run-all-testsets.")
     parser.add_argument('--schema-file', type=str, help="Path to schema file. This may be needed for some tests.")
 
     args = parser.parse_args()
@@ -81,13 +87,35 @@ def parse_args() -> argparse.Namespace:
 # See README for more info.
 default_interpreter = True
 
-if default_interpreter:
-    from tensorflow.lite.python.interpreter import Interpreter
-    from tensorflow.lite.python.interpreter import OpResolverType
-else:
-    from tflite_runtime.interpreter import Interpreter
-    from tflite_runtime.interpreter import OpResolverType
-    import tflite_runtime as tfl_runtime
+# Importing tensorflow takes seconds, so it is only done by import_tensorflow() once test data is generated.
+tf = None
+Interpreter = None
+OpResolverType = None
+tfl_runtime = None
+
+
+def import_tensorflow() -> None:
+    global tf, Interpreter, OpResolverType, tfl_runtime
+    if tf is not None:
+        return
+
+    try:
+        import tensorflow as tf
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+    if version.parse(tf.__version__) < REQUIRED_MINIMUM_TENSORFLOW_VERSION:
+        print("Unsupported tensorflow version, ", version.parse(tf.__version__))
+        sys.exit(0)
+
+    if default_interpreter:
+        from tensorflow.lite.python.interpreter import Interpreter
+        from tensorflow.lite.python.interpreter import OpResolverType
+    else:
+        from tflite_runtime.interpreter import Interpreter
+        from tflite_runtime.interpreter import OpResolverType
+        import tflite_runtime as tfl_runtime
 
 
 class TestSettings(ABC):
@@ -102,6 +130,20 @@ class TestSettings(ABC):
     # It also convinient when testing changes in the script, to be able to run all test sets again.
     PREGEN = 'PregeneratedData/'
 
+    # Test sets with generated files waiting to be formatted. The files of all of them are formatted together by
+    # flush_formatting(), so clang-format is started as few times as possible.
+    testsets_to_format = []
+
+    # Random generator for new data, shared by all test sets of a process.
+    rng = np.random.default_rng()
+
+    # Version comment of all generated files, see tensor_flow_reference_version.
+    reference_version = None
+
+    # Rough generation time of a test set, relative to the other test types. Test sets generated in parallel are
+    # started in order of decreasing generation time, so that a slow one does not end up last.
+    relative_generation_time = 1
+
     def __init__(self,
                  dataset,
                  testtype,
@@ -131,22 +173,6 @@ class TestSettings(ABC):
                  dilation_x=1,
                  dilation_y=1):
 
-        self.tensor_flow_reference_version = (
-            "// Generated by {} using tensorflow version {} (Keras version {}).\n".format(
-                os.path.basename(__file__), tf.__version__, tf.keras.__version__))
-
-        if 'tflite_runtime' in sys.modules:
-            revision = tfl_runtime.__git_version__
-            version = tfl_runtime.__version__
-            interpreter = "tflite_runtime"
-        else:
-            revision = tf.__git_version__
-            version = tf.__version__
-            interpreter = "tensorflow"
-
-        self.tensor_flow_reference_version += ("// Interpreter from {} version {} and revision {}.\n".format(
-            interpreter, version, revision))
-
         # Randomization interval
         self.mins = randmin
         self.maxs = randmax
@@ -189,13 +215,32 @@ class TestSettings(ABC):
         self.generated_header_files = []
         self.pregenerated_data_dir = self.PREGEN
 
+        # Generated files waiting to be formatted, mapped to the digest of their unformatted content.
+        self.pending_format_files = {}
+        self.header_hashes = None
+        # Set once the test set is generated, its stamp is then saved when its files have been formatted.
+        self.generated_stamp_pending = False
+
         self.config_data = "config_data.h"
+        # Content of the config header while its defines are added, it is written by write_c_header_wrapper().
+        self.config_header = None
 
         self.testdataset = dataset
 
-        self.kernel_table_file = self.pregenerated_data_dir + self.testdataset + '/' + 'kernel.txt'
-        self.inputs_table_file = self.pregenerated_data_dir + self.testdataset + '/' + 'input.txt'
-        self.bias_table_file = self.pregenerated_data_dir + self.testdataset + '/' + 'bias.txt'
+        # The pregenerated data directory is only created once the test set is generated, see save_pregenerated_data().
+        self.pregenerated_testset_dir = self.pregenerated_data_dir + self.testdataset + '/'
+
+        self.header_hashes_file = self.pregenerated_testset_dir + 'header_hashes.json'
+        self.generated_stamp_file = self.pregenerated_testset_dir + 'generated.json'
+
+        # All pregenerated tables of the test set are kept in one archive, which is loaded on first use.
+        self.pregenerated_data_file = self.pregenerated_testset_dir + 'data.npz'
+        self.pregenerated_data = None
+        self.pregenerated_data_changed = False
+        self.legacy_data_files = []
+        self.kernel_table = 'kernel'
+        self.inputs_table = 'input'
+        self.bias_table = 'bias'
 
         if self.has_padding:
             self.padding = 'SAME'
@@ -206,10 +251,15 @@ class TestSettings(ABC):
         self.regenerate_new_input = regenerate_input
         self.regenerate_new_bias = regenerate_biases
         self.schema_file = schema_file
+        self.json_template = None
 
         self.headers_dir = self.OUTDIR + self.testdataset + '/'
         os.makedirs(self.headers_dir, exist_ok=True)
 
+        # Defines in the config header are prefixed with the test set name.
+        self.config_data_file = self.headers_dir + self.config_data
+        self.config_prefix = self.testdataset.upper()
+
         self.model_path = "{}model_{}".format(self.headers_dir, self.testdataset)
         self.model_path_tflite = self.model_path + '.tflite'
 
@@ -218,15 +268,47 @@ class TestSettings(ABC):
         self.bias_data_file_prefix = "biases"
         self.output_data_file_prefix = "output_ref"
 
-    def save_multiple_dim_array_in_txt(self, file, data):
-        header = ','.join(map(str, data.shape))
-        np.savetxt(file, data.reshape(-1, data.shape[-1]), header=header, delimiter=',')
+    def load_pregenerated_data(self):
+        if self.pregenerated_data is not None:
+            return
+        self.pregenerated_data = {}
+        if os.path.exists(self.pregenerated_data_file):
+            with np.load(self.pregenerated_data_file) as data:
+                self.pregenerated_data = dict(data)
+
+    def save_pregenerated_data(self):
+        # The header hashes and the generated stamp of the test set are written to the same directory after this.
+        os.makedirs(self.pregenerated_testset_dir, exist_ok=True)
+        if not self.pregenerated_data_changed:
+            return
+        print("Saving data to {}".format(self.pregenerated_data_file))
+        np.savez(self.pregenerated_data_file, **self.pregenerated_data)
+        self.pregenerated_data_changed = False
+
+        while len(self.legacy_data_files) > 0:
+            os.remove(self.legacy_data_files.pop())
+
+    def load_legacy_table(self, table):
+        """
+        Pregenerated data used to be stored with one .npy file, or before that one text file, per table. Move any
+        such file into the archive, so it is still used.
+        """
+        legacy_file = self.pregenerated_testset_dir + table
+        if os.path.exists(legacy_file + '.npy'):
+            legacy_file += '.npy'
+            data = np.load(legacy_file)
+        elif os.path.exists(legacy_file + '.txt'):
+            legacy_file += '.txt'
+            with open(legacy_file) as f:
+                shape = list(map(int, next(f)[1:].split(',')))
+                data = np.genfromtxt(f, delimiter=',').reshape(shape).astype(np.float32)
+        else:
+            return
 
-    def load_multiple_dim_array_from_txt(self, file):
-        with open(file) as f:
-            shape = list(map(int, next(f)[1:].split(',')))
-            data = np.genfromtxt(f, delimiter=',').reshape(shape)
-        return data.astype(np.float32)
+        print("Converting data from {} to {}".format(legacy_file, self.pregenerated_data_file))
+        self.pregenerated_data[table] = data
+        self.pregenerated_data_changed = True
+        self.legacy_data_files.append(legacy_file)
 
     def convert_tensor_np(self, tensor_in, converter, *qminmax):
         w = tensor_in.numpy()
@@ -239,135 +321,267 @@ class TestSettings(ABC):
         fw.shape = shape
         return tf.convert_to_tensor(fw)
 
-    def convert_tensor(self, tensor_in, converter, *qminmax):
-        w = tensor_in.numpy()
-        shape = w.shape
-        w = w.ravel()
-        normal = np.array(w)
-        float_normal = []
-
-        for i in normal:
-            if len(qminmax) == 2:
-                float_normal.append(converter(i, qminmax[0], qminmax[1]))
-            else:
-                float_normal.append(converter(i))
-
-        np_float_array = np.asarray(float_normal)
-        np_float_array.shape = shape
-
-        return tf.convert_to_tensor(np_float_array)
-
-    def get_randomized_data(self, dims, npfile, regenerate, decimals=0, minrange=None, maxrange=None):
+    def get_randomized_data(self, dims, table, regenerate, decimals=0, minrange=None, maxrange=None):
         if not minrange:
             minrange = self.mins
         if not maxrange:
             maxrange = self.maxs
-        if not os.path.exists(npfile) or regenerate:
-            regendir = os.path.dirname(npfile)
-            os.makedirs(regendir, exist_ok=True)
+        self.load_pregenerated_data()
+        if table not in self.pregenerated_data:
+            self.load_legacy_table(table)
+        if table not in self.pregenerated_data or regenerate:
             if decimals == 0:
-                data = tf.Variable(tf.random.uniform(dims, minval=minrange, maxval=maxrange, dtype=tf.dtypes.int64))
-                data = tf.cast(data, dtype=tf.float32)
+                # Integer data is stored with the smallest integer type that holds the range.
+                storage_type = np.promote_types(np.min_scalar_type(-abs(int(minrange))),
+                                                np.min_scalar_type(-abs(int(maxrange))))
+                data = self.rng.integers(minrange, maxrange, size=dims, dtype=np.int64).astype(storage_type)
             else:
-                data = tf.Variable(tf.random.uniform(dims, minval=minrange, maxval=maxrange, dtype=tf.dtypes.float32))
-                data = np.around(data.numpy(), decimals)
-                data = tf.convert_to_tensor(data)
+                data = np.around(self.rng.uniform(minrange, maxrange, size=dims), decimals).astype(np.float32)
 
-            print("Saving data to {}".format(npfile))
-            self.save_multiple_dim_array_in_txt(npfile, data.numpy())
+            print("Generating new {} data".format(table))
+            self.pregenerated_data[table] = data
+            self.pregenerated_data_changed = True
         else:
-            print("Loading data from {}".format(npfile))
-            data = tf.convert_to_tensor(self.load_multiple_dim_array_from_txt(npfile))
-        return data
+            print("Loading {} data from {}".format(table, self.pregenerated_data_file))
+            data = self.pregenerated_data[table]
+        return data.astype(np.float32)
 
     def get_randomized_input_data(self, input_data, input_shape=None):
         # Generate or load saved input data unless hardcoded data provided
         if input_shape is None:
             input_shape = [self.batches, self.y_input, self.x_input, self.input_ch]
         if input_data is not None:
-            input_data = tf.reshape(input_data, input_shape)
+            input_data = np.reshape(input_data, input_shape)
         else:
-            input_data = self.get_randomized_data(input_shape,
-                                                  self.inputs_table_file,
-                                                  regenerate=self.regenerate_new_input)
+            input_data = self.get_randomized_data(input_shape, self.inputs_table, regenerate=self.regenerate_new_input)
         return input_data
 
     def get_randomized_bias_data(self, biases):
         # Generate or load saved bias data unless hardcoded data provided
         if not self.generate_bias:
-            biases = tf.reshape(np.full([self.output_ch], 0), [self.output_ch])
+            biases = np.zeros(self.output_ch, dtype=np.float32)
         elif biases is not None:
-            biases = tf.reshape(biases, [self.output_ch])
+            biases = np.reshape(biases, [self.output_ch])
         else:
             biases = self.get_randomized_data([self.output_ch],
-                                              self.bias_table_file,
+                                              self.bias_table,
                                               regenerate=self.regenerate_new_bias,
                                               minrange=self.bias_mins,
                                               maxrange=self.bias_maxs)
         return biases
 
-    def format_output_file(self, file):
-        command_list = CLANG_FORMAT.split(' ')
-        command_list.append(file)
-        try:
-            process = subprocess.run(command_list)
-            if process.returncode != 0:
-                print(f"ERROR: {command_list = }")
-                sys.exit(1)
-        except Exception as e:
-            raise RuntimeError(f"{e} from: {command_list = }")
+    def format_output_file(self, file, digest=None):
+        """
+        Queue a generated file for formatting. All queued files are formatted at once by flush_formatting().
+        """
+        if not self.pending_format_files:
+            TestSettings.testsets_to_format.append(self)
+        self.pending_format_files[file] = digest
+
+    @staticmethod
+    def flush_formatting():
+        """
+        Format the queued files of all test sets. This must be called after the test sets have been generated, also
+        if generating one of them failed.
+        """
+        files = [file for testset in TestSettings.testsets_to_format for file in testset.pending_format_files]
+        for i in range(0, len(files), CLANG_FORMAT_MAX_FILES):
+            command_list = CLANG_FORMAT.split(' ')
+            command_list.extend(files[i:i + CLANG_FORMAT_MAX_FILES])
+            try:
+                process = subprocess.run(command_list)
+                if process.returncode != 0:
+                    print(f"ERROR: {command_list = }")
+                    sys.exit(1)
+            except Exception as e:
+                raise RuntimeError(f"{e} from: {command_list = }")
+
+        for testset in TestSettings.testsets_to_format:
+            testset.save_header_hashes()
+            if testset.generated_stamp_pending:
+                testset.save_generated_stamp()
+        TestSettings.testsets_to_format.clear()
+
+    def save_header_hashes(self):
+        self.load_header_hashes()
+        for file, digest in self.pending_format_files.items():
+            if digest is None:
+                self.header_hashes.pop(file, None)
+            else:
+                self.header_hashes[file] = [digest, self.file_digest(file)]
+        self.pending_format_files.clear()
+
+        with open(self.header_hashes_file, 'w') as f:
+            json.dump(self.header_hashes, f, indent=2, sort_keys=True)
+
+    def save_generated_stamp(self):
+        outputs = sorted(self.headers_dir + file for file in os.listdir(self.headers_dir))
+        with open(self.generated_stamp_file, 'w') as f:
+            json.dump({'version': self.tensor_flow_reference_version, 'outputs': outputs}, f, indent=2)
+
+    def outputs_up_to_date(self) -> bool:
+        """
+        Check if generate_data() can be skipped. That is the case if no data is regenerated and none of the
+        pregenerated data, this script, the json template or the outputs have changed since the outputs were
+        generated with the same tensorflow version.
+        """
+        if self.regenerate_new_weights or self.regenerate_new_input or self.regenerate_new_bias:
+            return False
+        if not os.path.exists(self.generated_stamp_file):
+            return False
+
+        with open(self.generated_stamp_file) as f:
+            stamp = json.load(f)
+        if stamp['version'] != self.tensor_flow_reference_version:
+            return False
+
+        stamp_mtime = os.path.getmtime(self.generated_stamp_file)
+        dependencies = [__file__, self.pregenerated_data_file] + stamp['outputs']
+        if self.json_template:
+            dependencies.append(self.json_template)
+        for file in dependencies:
+            if not os.path.exists(file) or os.path.getmtime(file) > stamp_mtime:
+                return False
+        return True
+
+    @property
+    def tensor_flow_reference_version(self) -> str:
+        """
+        Versions of tensorflow, keras and the interpreter used for generating data. Building it imports tensorflow,
+        so test sets can be created and passed to parallel workers without importing tensorflow.
+        """
+        if TestSettings.reference_version is None:
+            import_tensorflow()
+
+            reference_version = ("// Generated by {} using tensorflow version {} (Keras version {}).\n".format(
+                os.path.basename(__file__), tf.__version__, tf.keras.__version__))
+
+            if 'tflite_runtime' in sys.modules:
+                revision = tfl_runtime.__git_version__
+                version = tfl_runtime.__version__
+                interpreter = "tflite_runtime"
+            else:
+                revision = tf.__git_version__
+                version = tf.__version__
+                interpreter = "tensorflow"
+
+            reference_version += ("// Interpreter from {} version {} and revision {}.\n".format(
+                interpreter, version, revision))
+            TestSettings.reference_version = reference_version
+        return TestSettings.reference_version
+
+    def generate_data_if_outdated(self) -> None:
+        import_tensorflow()
+        if self.outputs_up_to_date():
+            print("Test set {} is up to date".format(self.testdataset))
+        else:
+            self.generate_data()
+            # Files waiting to be formatted would be newer than the stamp, it is saved by flush_formatting() then.
+            if self.pending_format_files:
+                self.generated_stamp_pending = True
+            else:
+                self.save_generated_stamp()
+
+    def load_header_hashes(self):
+        if self.header_hashes is None:
+            self.header_hashes = {}
+            if os.path.exists(self.header_hashes_file):
+                with open(self.header_hashes_file) as f:
+                    self.header_hashes = json.load(f)
+
+    def file_digest(self, file):
+        with open(file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def write_output_file(self, filepath, content):
+        """
+        Write a generated file and queue it for formatting. Both are skipped if the formatted file on disk was
+        generated from identical content and has not been changed since.
+        """
+        digest = hashlib.sha1(content.encode()).hexdigest()
+
+        self.load_header_hashes()
+        recorded = self.header_hashes.get(filepath)
+        if recorded and recorded[0] == digest and os.path.exists(filepath) and \
+           self.file_digest(filepath) == recorded[1]:
+            print("Unchanged {}".format(filepath))
+            return
+
+        with open(filepath, "w+", buffering=1 << 20) as f:
+            f.write(content)
+        self.format_output_file(filepath, digest)
 
     def write_c_header_wrapper(self):
+        self.flush_c_config_header()
+
         filename = "test_data.h"
         filepath = self.headers_dir + filename
 
         print("Generating C header wrapper {}...".format(filepath))
-        with open(filepath, 'w+') as f:
-            f.write(self.tensor_flow_reference_version)
-            while len(self.generated_header_files) > 0:
-                f.write('#include "{}"\n'.format(self.generated_header_files.pop()))
-        self.format_output_file(filepath)
+        # Sorted so the content does not depend on the order in which the headers were generated.
+        includes = ''.join('#include "{}"\n'.format(header) for header in sorted(self.generated_header_files))
+        self.generated_header_files.clear()
+        self.write_output_file(filepath, self.tensor_flow_reference_version + includes)
+        self.save_pregenerated_data()
 
-    def write_common_config(self, f, prefix):
+    def get_common_config(self) -> list:
         """
         Shared by conv/depthwise_conv and pooling
         """
-        f.write("#define {}_FILTER_X {}\n".format(prefix, self.filter_x))
-        f.write("#define {}_FILTER_Y {}\n".format(prefix, self.filter_y))
-        f.write("#define {}_STRIDE_X {}\n".format(prefix, self.stride_x))
-        f.write("#define {}_STRIDE_Y {}\n".format(prefix, self.stride_y))
-        f.write("#define {}_PAD_X {}\n".format(prefix, self.pad_x))
-        f.write("#define {}_PAD_Y {}\n".format(prefix, self.pad_y))
-        f.write("#define {}_OUTPUT_W {}\n".format(prefix, self.x_output))
-        f.write("#define {}_OUTPUT_H {}\n".format(prefix, self.y_output))
+        return [
+            ("FILTER_X", self.filter_x),
+            ("FILTER_Y", self.filter_y),
+            ("STRIDE_X", self.stride_x),
+            ("STRIDE_Y", self.stride_y),
+            ("PAD_X", self.pad_x),
+            ("PAD_Y", self.pad_y),
+            ("OUTPUT_W", self.x_output),
+            ("OUTPUT_H", self.y_output),
+        ]
+
+    @staticmethod
+    def format_defines(prefix, defines) -> str:
+        """
+        Format a list of (name, value) pairs as prefixed C defines.
+        """
+        return "".join("#define {}_{} {}\n".format(prefix, name, value) for name, value in defines)
+
+    def append_c_config_defines(self, defines) -> None:
+        """
+        Append (name, value) pairs to the config header started by write_c_config_header().
+        """
+        self.config_header.write(self.format_defines(self.config_prefix, defines))
+
+    def flush_c_config_header(self) -> None:
+        if self.config_header is None:
+            return
+        self.write_output_file(self.config_data_file, self.config_header.getvalue())
+        self.config_header = None
 
     def write_c_common_header(self, f):
         f.write(self.tensor_flow_reference_version)
         f.write("#pragma once\n")
 
     def write_c_config_header(self, write_common_parameters=True) -> None:
-        filename = self.config_data
-
-        self.generated_header_files.append(filename)
-        filepath = self.headers_dir + filename
-
-        prefix = self.testdataset.upper()
+        filepath = self.config_data_file
+        self.generated_header_files.append(self.config_data)
 
         print("Writing C header with config data {}...".format(filepath))
-        with open(filepath, "w+") as f:
-            self.write_c_common_header(f)
-            if (write_common_parameters):
-                f.write("#define {}_OUT_CH {}\n".format(prefix, self.output_ch))
-                f.write("#define {}_IN_CH {}\n".format(prefix, self.input_ch))
-                f.write("#define {}_INPUT_W {}\n".format(prefix, self.x_input))
-                f.write("#define {}_INPUT_H {}\n".format(prefix, self.y_input))
-                f.write("#define {}_DST_SIZE {}\n".format(prefix, self.x_output * self.y_output * self.output_ch *
-                                                          self.batches))
-                f.write("#define {}_INPUT_SIZE {}\n".format(prefix, self.x_input * self.y_input * self.input_ch))
-                f.write("#define {}_OUT_ACTIVATION_MIN {}\n".format(prefix, self.out_activation_min))
-                f.write("#define {}_OUT_ACTIVATION_MAX {}\n".format(prefix, self.out_activation_max))
-                f.write("#define {}_INPUT_BATCHES {}\n".format(prefix, self.batches))
-        self.format_output_file(filepath)
+        f = self.config_header = io.StringIO()
+        self.write_c_common_header(f)
+        if (write_common_parameters):
+            f.write(
+                self.format_defines(self.config_prefix, [
+                    ("OUT_CH", self.output_ch),
+                    ("IN_CH", self.input_ch),
+                    ("INPUT_W", self.x_input),
+                    ("INPUT_H", self.y_input),
+                    ("DST_SIZE", self.x_output * self.y_output * self.output_ch * self.batches),
+                    ("INPUT_SIZE", self.x_input * self.y_input * self.input_ch),
+                    ("OUT_ACTIVATION_MIN", self.out_activation_min),
+                    ("OUT_ACTIVATION_MAX", self.out_activation_max),
+                    ("INPUT_BATCHES", self.batches),
+                ]))
 
     def get_data_file_name_info(self, name_prefix) -> (str, str):
         filename = name_prefix + "_data.h"
@@ -393,18 +607,21 @@ class TestSettings(ABC):
         self.generated_header_files.append(filename)
 
         print("Generating C header {}...".format(filepath))
-        with open(filepath, "w+") as f:
-            self.write_c_common_header(f)
-            f.write("#include <stdint.h>\n\n")
-            if size > 0:
-                f.write(const + datatype + " " + self.testdataset + '_' + name + "[%d] =\n{\n" % size)
-                for i in range(size - 1):
-                    f.write("  %d,\n" % w[i])
-                f.write("  %d\n" % w[size - 1])
-                f.write("};\n")
-            else:
-                f.write(const + datatype + " *" + self.testdataset + '_' + name + " = NULL;\n")
-        self.format_output_file(filepath)
+        f = io.StringIO()
+        self.write_c_common_header(f)
+        f.write("#include <stdint.h>\n\n")
+        if size > 0:
+            f.write(const + datatype + " " + self.testdataset + '_' + name + "[%d] =\n{\n" % size)
+            # Python ints are formatted a lot faster by str() than numpy formats elements. Like %d, float data is
+            # truncated to integers first.
+            w = np.asarray(w)
+            if w.dtype.kind == 'f':
+                w = w.astype(np.int64)
+            f.write("  " + ",\n  ".join(map(str, w.tolist())) + "\n")
+            f.write("};\n")
+        else:
+            f.write(const + datatype + " *" + self.testdataset + '_' + name + " = NULL;\n")
+        self.write_output_file(filepath, f.getvalue())
 
     def set_output_dims_and_padding(self, output_x, output_y):
         self.x_output = output_x
@@ -429,31 +646,62 @@ class TestSettings(ABC):
         ''' Must be overriden '''
 
     def quantize_scale(self, scale):
-        significand, shift = math.frexp(scale)
-        significand_q31 = round(significand * (1 << 31))
-        return significand_q31, shift
+        multiplier, shift = self.quantize_scales([scale])
+        return int(multiplier[0]), int(shift[0])
+
+    def quantize_scales(self, scales):
+        """
+        Quantize scales to Q31 multipliers and shifts. Returns int32 arrays of multipliers and shifts.
+        """
+        significand, shift = np.frexp(np.asarray(scales, dtype=np.float64))
+        multiplier = np.round(significand * (1 << 31)).astype(np.int64)
+
+        # Like TFLite's QuantizeMultiplier(), keep the multiplier within int32 and flush too small scales to zero.
+        overflow = multiplier == (1 << 31)
+        multiplier[overflow] //= 2
+        shift[overflow] += 1
+        underflow = shift < -31
+        multiplier[underflow] = 0
+        shift[underflow] = 0
+
+        return multiplier.astype(np.int32), shift.astype(np.int32)
 
     def get_calib_data_func(self, n_inputs, shape):
+        if n_inputs <= 0:
+            raise RuntimeError("Invalid number of representative test sets: {}. Must be more than 0".format(
+                self.test_type))
+
+        # All inputs share one array of ones, it is only read by the converter.
+        representative_testsets = [np.ones(shape, dtype=np.float32)] * n_inputs
 
         def representative_data_gen():
-            representative_testsets = []
-            if n_inputs > 0:
-                for i in range(n_inputs):
-                    representative_testsets.append(np.ones(shape, dtype=np.float32))
-                yield representative_testsets
-            else:
-                raise RuntimeError("Invalid number of representative test sets: {}. Must be more than 0".format(
-                    self.test_type))
+            yield representative_testsets
 
         return representative_data_gen
 
+    def get_cached_model_file(self, model, inttype, dataset_shape) -> str:
+        """
+        The converted model only depends on the layers, their weights and the quantization options, so it can be
+        reused from an earlier run if none of those changed. Layer names are left out as they are auto-generated.
+        The converter options are set by this script, so any change of the script invalidates the cached model.
+        """
+        key = hashlib.sha1(self.file_digest(__file__).encode())
+        for layer in model.layers:
+            config = layer.get_config()
+            config.pop('name', None)
+            key.update(type(layer).__name__.encode())
+            key.update(json.dumps(config, sort_keys=True, default=str).encode())
+        for weights in model.get_weights():
+            key.update(np.ascontiguousarray(weights).tobytes())
+        key.update(repr((inttype.name, self.is_int16xint8, tuple(dataset_shape), tf.__version__)).encode())
+
+        return self.pregenerated_testset_dir + 'model_{}.tflite'.format(key.hexdigest())
+
     def convert_and_interpret(self, model, inttype, input_data=None, dataset_shape=None) -> Interpreter:
         """
-        Compile and convert a model to Tflite format, run interpreter and allocate tensors.
+        Convert a model to Tflite format, run interpreter and allocate tensors. The input and output details of the
+        interpreter are kept in self.input_details and self.output_details.
         """
-        model.compile(loss=tf.keras.losses.categorical_crossentropy,
-                      optimizer=tf.keras.optimizers.Adam(),
-                      metrics=['accuracy'])
         n_inputs = len(model.inputs)
 
         if dataset_shape:
@@ -461,42 +709,69 @@ class TestSettings(ABC):
         else:
             representative_dataset_shape = (self.batches, self.y_input, self.x_input, self.input_ch)
 
-        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        cached_model_file = self.get_cached_model_file(model, inttype, representative_dataset_shape)
+        if os.path.exists(cached_model_file):
+            print("Loading converted model from {}".format(cached_model_file))
+            with open(cached_model_file, "rb") as f:
+                tflite_model = f.read()
+        else:
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
 
-        representative_dataset = self.get_calib_data_func(n_inputs, representative_dataset_shape)
+            representative_dataset = self.get_calib_data_func(n_inputs, representative_dataset_shape)
 
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        converter.representative_dataset = representative_dataset
-        if self.is_int16xint8:
-            converter.target_spec.supported_ops = [
-                tf.lite.OpsSet.EXPERIMENTAL_TFLITE_BUILTINS_ACTIVATIONS_INT16_WEIGHTS_INT8
-            ]
-        else:
-            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-        converter.inference_input_type = inttype
-        converter.inference_output_type = inttype
-        tflite_model = converter.convert()
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            if self.is_int16xint8:
+                converter.target_spec.supported_ops = [
+                    tf.lite.OpsSet.EXPERIMENTAL_TFLITE_BUILTINS_ACTIVATIONS_INT16_WEIGHTS_INT8
+                ]
+            else:
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = inttype
+            converter.inference_output_type = inttype
+            tflite_model = converter.convert()
+
+            # Only the latest converted model of a test set is kept.
+            for stale_model_file in glob.glob(self.pregenerated_testset_dir + 'model_*.tflite'):
+                os.remove(stale_model_file)
+            os.makedirs(self.pregenerated_testset_dir, exist_ok=True)
+            with open(cached_model_file, "wb") as f:
+                f.write(tflite_model)
 
-        os.makedirs(os.path.dirname(self.model_path_tflite), exist_ok=True)
         with open(self.model_path_tflite, "wb") as model:
             model.write(tflite_model)
 
-        interpreter = Interpreter(model_path=str(self.model_path_tflite),
-                                  experimental_op_resolver_type=OpResolverType.BUILTIN_REF)
-        interpreter.allocate_tensors()
+        interpreter = self.create_interpreter()
 
-        output_details = interpreter.get_output_details()
-        (self.output_scale, self.output_zero_point) = output_details[0]['quantization']
+        self.input_details = interpreter.get_input_details()
+        self.output_details = interpreter.get_output_details()
+        (self.output_scale, self.output_zero_point) = self.output_details[0]['quantization']
 
         if input_data is not None:
-            input_details = interpreter.get_input_details()
-            (self.input_scale, self.input_zero_point) = input_details[0]['quantization']
+            (self.input_scale, self.input_zero_point) = self.input_details[0]['quantization']
 
             # Set input tensors
-            interpreter.set_tensor(input_details[0]["index"], tf.cast(input_data, inttype))
+            interpreter.set_tensor(self.input_details[0]["index"], tf.cast(input_data, inttype))
 
         return interpreter
 
+    def create_interpreter(self) -> Interpreter:
+        """
+        Create an interpreter for the tflite model of the test set. The reference kernels are used, as the optimized
+        kernels do not always give bit exact results.
+        """
+        interpreter = Interpreter(model_path=str(self.model_path_tflite),
+                                  experimental_op_resolver_type=OpResolverType.BUILTIN_REF)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    @staticmethod
+    def get_tensor_details_by_name(interpreter) -> dict:
+        """
+        Tensor details of a model generated from a json template, by the tensor names of the template.
+        """
+        return {details['name']: details for details in interpreter.get_tensor_details()}
+
     def generate_json_from_template(self, weights_feature_data=None, weights_time_data=None, bias_data=None):
         """
         Takes a json template and parameters as input and creates a new json file.
@@ -514,13 +789,13 @@ class TestSettings(ABC):
             # Update weights and bias data
             if weights_feature_data is not None:
                 w_1_buffer_index = 1
-                data["buffers"][w_1_buffer_index]["data"] = self.to_bytes(weights_feature_data.numpy().ravel(), 1)
+                data["buffers"][w_1_buffer_index]["data"] = self.to_bytes(np.ravel(weights_feature_data), 1)
             if weights_time_data is not None:
                 w_2_buffer_index = 2
-                data["buffers"][w_2_buffer_index]["data"] = self.to_bytes(weights_time_data.numpy().ravel(), 2)
+                data["buffers"][w_2_buffer_index]["data"] = self.to_bytes(np.ravel(weights_time_data), 2)
             if bias_data is not None:
                 bias_buffer_index = 3
-                data["buffers"][bias_buffer_index]["data"] = self.to_bytes(bias_data.numpy().ravel(), 4)
+                data["buffers"][bias_buffer_index]["data"] = self.to_bytes(np.ravel(bias_data), 4)
 
             json.dump(data, out_file, indent=2)
 
@@ -541,22 +816,19 @@ class TestSettings(ABC):
             raise RuntimeError(f"{e} from: {command = }. Did you install flatc?")
 
     def to_bytes(self, tensor_data, type_size) -> bytes:
-        result_bytes = []
-
         if type_size == 1:
-            tensor_type = np.uint8
+            tensor_type = np.int8
         elif type_size == 2:
-            tensor_type = np.uint16
+            tensor_type = np.int16
         elif type_size == 4:
-            tensor_type = np.uint32
+            tensor_type = np.int32
         else:
             raise RuntimeError("Size not supported: {}".format(type_size))
 
-        for val in tensor_data:
-            for byte in int(tensor_type(val)).to_bytes(type_size, 'little'):
-                result_bytes.append(byte)
+        # Cast via the signed type so negative values are stored as two's complement, little-endian as in tflite.
+        tensor_data = np.asarray(tensor_data).astype(np.dtype(tensor_type).newbyteorder('<'), copy=False)
 
-        return result_bytes
+        return list(tensor_data.tobytes())
 
 
 class ConvSettings(TestSettings):
@@ -627,35 +899,26 @@ class ConvSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header()
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            self.write_common_config(f, prefix)
-            if self.test_type == 'depthwise_conv':
-                f.write("#define {}_CH_MULT {}\n".format(prefix, self.channel_multiplier))
-            f.write("#define {}_INPUT_OFFSET {}\n".format(prefix, -self.input_zero_point))
-            f.write("#define {}_OUTPUT_OFFSET {}\n".format(prefix, self.output_zero_point))
-            f.write("#define {}_DILATION_X {}\n".format(prefix, self.dilation_x))
-            f.write("#define {}_DILATION_Y {}\n".format(prefix, self.dilation_y))
+        defines = self.get_common_config()
+        if self.test_type == 'depthwise_conv':
+            defines.append(("CH_MULT", self.channel_multiplier))
+        defines += [
+            ("INPUT_OFFSET", -self.input_zero_point),
+            ("OUTPUT_OFFSET", self.output_zero_point),
+            ("DILATION_X", self.dilation_x),
+            ("DILATION_Y", self.dilation_y),
+        ]
+        self.append_c_config_defines(defines)
 
     def generate_quantize_per_channel_multiplier(self):
         num_channels = self.output_ch
-        per_channel_multiplier = []
-        per_channel_shift = []
 
         if len(self.scaling_factors) != num_channels:
             raise RuntimeError("Missing scaling factors")
 
-        for i in range(num_channels):
-            effective_output_scale = self.input_scale * self.scaling_factors[i] / self.output_scale
-            (quantized_multiplier, shift) = self.quantize_scale(effective_output_scale)
-
-            per_channel_multiplier.append(quantized_multiplier)
-            per_channel_shift.append(shift)
-
-        return per_channel_multiplier, per_channel_shift
+        # In double precision like the per channel version.
+        scaling_factors = np.asarray(self.scaling_factors, dtype=np.float64)
+        return self.quantize_scales(self.input_scale * scaling_factors / self.output_scale)
 
     def generate_data(self, input_data=None, weights=None, biases=None) -> None:
         if self.is_int16xint8:
@@ -675,13 +938,12 @@ class ConvSettings(TestSettings):
             out_channel = self.channel_multiplier
 
         if weights is not None:
-            weights = tf.reshape(weights, [self.filter_y, self.filter_x, self.input_ch, out_channel])
+            weights = np.reshape(weights, [self.filter_y, self.filter_x, self.input_ch, out_channel])
         else:
             weights = self.get_randomized_data([self.filter_y, self.filter_x, self.input_ch, out_channel],
-                                               self.kernel_table_file,
+                                               self.kernel_table,
                                                minrange=INT32_MIN,
                                                maxrange=INT32_MAX,
-                                               decimals=1,
                                                regenerate=self.regenerate_new_weights)
 
         biases = self.get_randomized_bias_data(biases)
@@ -713,11 +975,11 @@ class ConvSettings(TestSettings):
         all_layers_details = interpreter.get_tensor_details()
         filter_layer = all_layers_details[2]
         bias_layer = all_layers_details[1]
-        if weights.numpy().size != interpreter.get_tensor(filter_layer['index']).size or \
-           (self.generate_bias and biases.numpy().size != interpreter.get_tensor(bias_layer['index']).size):
+        if np.size(weights) != np.prod(filter_layer['shape']) or \
+           (self.generate_bias and np.size(biases) != np.prod(bias_layer['shape'])):
             raise RuntimeError(f"Dimension mismatch for {self.testdataset}")
 
-        output_details = interpreter.get_output_details()
+        output_details = self.output_details
         self.set_output_dims_and_padding(output_details[0]['shape'][2], output_details[0]['shape'][1])
 
         self.generate_c_array(self.input_data_file_prefix, input_data, datatype=datatype)
@@ -734,7 +996,7 @@ class ConvSettings(TestSettings):
         interpreter.invoke()
         output_data = interpreter.get_tensor(output_details[0]["index"])
         self.generate_c_array(self.output_data_file_prefix,
-                              np.clip(output_data, self.out_activation_min, self.out_activation_max),
+                              np.clip(output_data, self.out_activation_min, self.out_activation_max, out=output_data),
                               datatype=datatype)
 
         self.write_c_config_header()
@@ -800,8 +1062,6 @@ class PoolingSettings(TestSettings):
         input_data = self.get_randomized_input_data(input_data)
         self.generate_c_array(self.input_data_file_prefix, input_data, datatype=datatype)
 
-        input_data = tf.cast(input_data, tf.float32)
-
         # Create a one-layer Keras model
         model = tf.keras.models.Sequential()
         input_shape = (self.batches, self.y_input, self.x_input, self.input_ch)
@@ -823,14 +1083,14 @@ class PoolingSettings(TestSettings):
 
         interpreter = self.convert_and_interpret(model, inttype, input_data)
 
-        output_details = interpreter.get_output_details()
+        output_details = self.output_details
         self.set_output_dims_and_padding(output_details[0]['shape'][2], output_details[0]['shape'][1])
 
         # Generate reference
         interpreter.invoke()
         output_data = interpreter.get_tensor(output_details[0]["index"])
         self.generate_c_array(self.output_data_file_prefix,
-                              np.clip(output_data, self.out_activation_min, self.out_activation_max),
+                              np.clip(output_data, self.out_activation_min, self.out_activation_max, out=output_data),
                               datatype=datatype)
 
         self.write_c_config_header()
@@ -839,12 +1099,7 @@ class PoolingSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header()
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            self.write_common_config(f, prefix)
+        self.append_c_config_defines(self.get_common_config())
 
 
 class FullyConnectedSettings(TestSettings):
@@ -902,16 +1157,13 @@ class FullyConnectedSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header()
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            f.write("#define {}_OUTPUT_MULTIPLIER {}\n".format(prefix, self.quantized_multiplier))
-            f.write("#define {}_OUTPUT_SHIFT {}\n".format(prefix, self.quantized_shift))
-            f.write("#define {}_ACCUMULATION_DEPTH {}\n".format(prefix, self.input_ch * self.x_input * self.y_input))
-            f.write("#define {}_INPUT_OFFSET {}\n".format(prefix, -self.input_zero_point))
-            f.write("#define {}_OUTPUT_OFFSET {}\n".format(prefix, self.output_zero_point))
+        self.append_c_config_defines([
+            ("OUTPUT_MULTIPLIER", self.quantized_multiplier),
+            ("OUTPUT_SHIFT", self.quantized_shift),
+            ("ACCUMULATION_DEPTH", self.input_ch * self.x_input * self.y_input),
+            ("INPUT_OFFSET", -self.input_zero_point),
+            ("OUTPUT_OFFSET", self.output_zero_point),
+        ])
 
     def quantize_multiplier(self):
         input_product_scale = self.input_scale * self.weights_scale
@@ -936,10 +1188,10 @@ class FullyConnectedSettings(TestSettings):
         fc_weights_format = [self.input_ch * self.y_input * self.x_input, self.output_ch]
 
         if weights is not None:
-            weights = tf.reshape(weights, fc_weights_format)
+            weights = np.reshape(weights, fc_weights_format)
         else:
             weights = self.get_randomized_data(fc_weights_format,
-                                               self.kernel_table_file,
+                                               self.kernel_table,
                                                minrange=INT32_MIN,
                                                maxrange=INT32_MAX,
                                                regenerate=self.regenerate_new_weights)
@@ -963,15 +1215,15 @@ class FullyConnectedSettings(TestSettings):
             bias_layer = all_layers_details[1]
         else:
             filter_layer = all_layers_details[1]
-        if weights.numpy().size != interpreter.get_tensor(filter_layer['index']).size or \
-           (self.generate_bias and biases.numpy().size != interpreter.get_tensor(bias_layer['index']).size):
+        if np.size(weights) != np.prod(filter_layer['shape']) or \
+           (self.generate_bias and np.size(biases) != np.prod(bias_layer['shape'])):
             raise RuntimeError(f"Dimension mismatch for {self.testdataset}")
 
         # The generic destination size calculation for these tests are: self.x_output * self.y_output * self.output_ch
         # * self.batches.
         self.x_output = 1
         self.y_output = 1
-        output_details = interpreter.get_output_details()
+        output_details = self.output_details
         if self.output_ch != output_details[0]['shape'][1] or self.batches != output_details[0]['shape'][0]:
             raise RuntimeError("Fully connected out dimension mismatch")
 
@@ -991,7 +1243,7 @@ class FullyConnectedSettings(TestSettings):
         interpreter.invoke()
         output_data = interpreter.get_tensor(output_details[0]["index"])
         self.generate_c_array(self.output_data_file_prefix,
-                              np.clip(output_data, self.out_activation_min, self.out_activation_max),
+                              np.clip(output_data, self.out_activation_min, self.out_activation_max, out=output_data),
                               datatype=datatype)
 
         self.write_c_config_header()
@@ -1067,27 +1319,23 @@ class SoftmaxSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header(write_common_parameters=False)
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            f.write("#define {}_NUM_ROWS {}\n".format(prefix, self.y_input))
-            f.write("#define {}_ROW_SIZE {}\n".format(prefix, self.x_input))
-            f.write("#define {}_INPUT_MULT {}\n".format(prefix, self.input_multiplier))
-            f.write("#define {}_INPUT_LEFT_SHIFT {}\n".format(prefix, self.input_left_shift))
-            if not self.is_int16xint8:
-                f.write("#define {}_DIFF_MIN {}\n".format(prefix, -self.diff_min))
-            f.write("#define {}_DST_SIZE {}\n".format(prefix, self.x_output * self.y_output))
+        defines = [
+            ("NUM_ROWS", self.y_input),
+            ("ROW_SIZE", self.x_input),
+            ("INPUT_MULT", self.input_multiplier),
+            ("INPUT_LEFT_SHIFT", self.input_left_shift),
+        ]
+        if not self.is_int16xint8:
+            defines.append(("DIFF_MIN", -self.diff_min))
+        defines.append(("DST_SIZE", self.x_output * self.y_output))
+        self.append_c_config_defines(defines)
 
     def get_softmax_randomized_input_data(self, input_data, input_shape):
         # Generate or load saved input data unless hardcoded data provided.
         if input_data is not None:
-            input_data = tf.reshape(input_data, input_shape)
+            input_data = np.reshape(input_data, input_shape)
         else:
-            input_data = self.get_randomized_data(input_shape,
-                                                  self.inputs_table_file,
-                                                  regenerate=self.regenerate_new_input)
+            input_data = self.get_randomized_data(input_shape, self.inputs_table, regenerate=self.regenerate_new_input)
         return input_data
 
     def generate_data(self, input_data=None, weights=None, biases=None) -> None:
@@ -1112,12 +1360,10 @@ class SoftmaxSettings(TestSettings):
             generated_json = self.generate_json_from_template()
             self.flatc_generate_tflite(generated_json, self.schema_file)
 
-            interpreter = Interpreter(model_path=str(self.model_path_tflite),
-                                      experimental_op_resolver_type=OpResolverType.BUILTIN_REF)
-            interpreter.allocate_tensors()
-            all_layers_details = interpreter.get_tensor_details()
-            input_layer = all_layers_details[0]
-            output_layer = all_layers_details[1]
+            interpreter = self.create_interpreter()
+            tensor_details = self.get_tensor_details_by_name(interpreter)
+            input_layer = tensor_details['softmax_input']
+            output_layer = tensor_details['softmax_output']
 
             interpreter.set_tensor(input_layer["index"], tf.cast(input_data, tf.int8))
             interpreter.invoke()
@@ -1129,7 +1375,7 @@ class SoftmaxSettings(TestSettings):
             model.add(tf.keras.layers.Softmax(input_shape=input_shape))
 
             interpreter = self.convert_and_interpret(model, inttype, tf.expand_dims(input_data, axis=0))
-            output_details = interpreter.get_output_details()
+            output_details = self.output_details
             interpreter.invoke()
             output_data = interpreter.get_tensor(output_details[0]["index"])
 
@@ -1194,7 +1440,7 @@ class SVDFSettings(TestSettings):
         self.memory_size = memory_size
         self.rank = rank
         self.number_filters = self.number_units * self.rank
-        self.time_table_file = self.pregenerated_data_dir + self.testdataset + '/' + 'time_data.txt'
+        self.time_table = 'time_data'
 
         self.number_inputs = number_inputs
         self.input_sequence_length = self.number_inputs * self.input_size * self.batches
@@ -1234,34 +1480,31 @@ class SVDFSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header(write_common_parameters=False)
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            f.write("#define {}_MULTIPLIER_IN {}\n".format(prefix, self.multiplier_in))
-            f.write("#define {}_MULTIPLIER_OUT {}\n".format(prefix, self.multiplier_out))
-            f.write("#define {}_SHIFT_1 {}\n".format(prefix, self.shift_1))
-            f.write("#define {}_SHIFT_2 {}\n".format(prefix, self.shift_2))
-            f.write("#define {}_IN_ACTIVATION_MIN {}\n".format(prefix, self.in_activation_min))
-            f.write("#define {}_IN_ACTIVATION_MAX {}\n".format(prefix, self.in_activation_max))
-            f.write("#define {}_RANK {}\n".format(prefix, self.rank))
-            f.write("#define {}_FEATURE_BATCHES {}\n".format(prefix, self.number_filters))
-            f.write("#define {}_TIME_BATCHES {}\n".format(prefix, self.memory_size))
-            f.write("#define {}_INPUT_SIZE {}\n".format(prefix, self.input_size))
-            f.write("#define {}_DST_SIZE {}\n".format(prefix, self.number_units * self.batches))
-            f.write("#define {}_OUT_ACTIVATION_MIN {}\n".format(prefix, self.out_activation_min))
-            f.write("#define {}_OUT_ACTIVATION_MAX {}\n".format(prefix, self.out_activation_max))
-            f.write("#define {}_INPUT_BATCHES {}\n".format(prefix, self.batches))
-            f.write("#define {}_INPUT_OFFSET {}\n".format(prefix, self.input_zero_point))
-            f.write("#define {}_OUTPUT_OFFSET {}\n".format(prefix, self.output_zero_point))
+        self.append_c_config_defines([
+            ("MULTIPLIER_IN", self.multiplier_in),
+            ("MULTIPLIER_OUT", self.multiplier_out),
+            ("SHIFT_1", self.shift_1),
+            ("SHIFT_2", self.shift_2),
+            ("IN_ACTIVATION_MIN", self.in_activation_min),
+            ("IN_ACTIVATION_MAX", self.in_activation_max),
+            ("RANK", self.rank),
+            ("FEATURE_BATCHES", self.number_filters),
+            ("TIME_BATCHES", self.memory_size),
+            ("INPUT_SIZE", self.input_size),
+            ("DST_SIZE", self.number_units * self.batches),
+            ("OUT_ACTIVATION_MIN", self.out_activation_min),
+            ("OUT_ACTIVATION_MAX", self.out_activation_max),
+            ("INPUT_BATCHES", self.batches),
+            ("INPUT_OFFSET", self.input_zero_point),
+            ("OUTPUT_OFFSET", self.output_zero_point),
+        ])
 
     def generate_data(self, input_data=None, weights=None, biases=None, time_data=None, state_data=None) -> None:
         if input_data is not None:
             input_data = tf.reshape(input_data, [self.input_sequence_length])
         else:
             input_data = self.get_randomized_data([self.input_sequence_length],
-                                                  self.inputs_table_file,
+                                                  self.inputs_table,
                                                   regenerate=self.regenerate_new_input)
         self.generate_c_array("input_sequence", input_data)
 
@@ -1269,14 +1512,14 @@ class SVDFSettings(TestSettings):
             weights_feature_data = tf.reshape(weights, [self.number_filters, self.input_size])
         else:
             weights_feature_data = self.get_randomized_data([self.number_filters, self.input_size],
-                                                            self.kernel_table_file,
+                                                            self.kernel_table,
                                                             regenerate=self.regenerate_new_weights)
 
         if time_data is not None:
             weights_time_data = tf.reshape(time_data, [self.number_filters, self.memory_size])
         else:
             weights_time_data = self.get_randomized_data([self.number_filters, self.memory_size],
-                                                         self.time_table_file,
+                                                         self.time_table,
                                                          regenerate=self.regenerate_new_weights)
 
         if not self.generate_bias:
@@ -1285,7 +1528,7 @@ class SVDFSettings(TestSettings):
             biases = tf.reshape(biases, [self.number_units])
         else:
             biases = self.get_randomized_data([self.number_units],
-                                              self.bias_table_file,
+                                              self.bias_table,
                                               regenerate=self.regenerate_new_weights)
 
         # Generate tflite model
@@ -1293,18 +1536,16 @@ class SVDFSettings(TestSettings):
         self.flatc_generate_tflite(generated_json, self.schema_file)
 
         # Run TFL interpreter
-        interpreter = Interpreter(model_path=str(self.model_path_tflite),
-                                  experimental_op_resolver_type=OpResolverType.BUILTIN_REF)
-        interpreter.allocate_tensors()
+        interpreter = self.create_interpreter()
 
         # Read back scales and zero points from tflite model
-        all_layers_details = interpreter.get_tensor_details()
-        input_layer = all_layers_details[0]
-        weights_1_layer = all_layers_details[1]
-        weights_2_layer = all_layers_details[2]
-        bias_layer = all_layers_details[3]
-        state_layer = all_layers_details[4]
-        output_layer = all_layers_details[5]
+        tensor_details = self.get_tensor_details_by_name(interpreter)
+        input_layer = tensor_details['tensor_input']
+        weights_1_layer = tensor_details['tensor_weight_1']
+        weights_2_layer = tensor_details['tensor_weight_2']
+        bias_layer = tensor_details['tensor_bias']
+        state_layer = tensor_details['tensor_state']
+        output_layer = tensor_details['tensor_output']
         (input_scale, self.input_zero_point) = self.get_scale_and_zp(input_layer)
         (weights_1_scale, zero_point) = self.get_scale_and_zp(weights_1_layer)
         (weights_2_scale, zero_point) = self.get_scale_and_zp(weights_2_layer)
@@ -1320,16 +1561,13 @@ class SVDFSettings(TestSettings):
         self.generate_c_array(self.bias_data_file_prefix, interpreter.get_tensor(bias_layer['index']), "int32_t")
         self.generate_c_array("state", interpreter.get_tensor(state_layer['index']), "int16_t")
 
-        # Generate reference output
-        svdf_ref = None
-        for i in range(self.number_inputs):
-            start = i * self.input_size * self.batches
-            end = i * self.input_size * self.batches + self.input_size * self.batches
-            input_sequence = input_data[start:end]
-            input_sequence = tf.reshape(input_sequence, [self.batches, self.input_size])
-            interpreter.set_tensor(input_layer["index"], tf.cast(input_sequence, tf.int8))
+        # Generate reference output. The state carries over between invocations, so the inputs have to be fed one at
+        # a time, but only the output of the last one is needed.
+        input_sequences = np.reshape(input_data, [self.number_inputs, self.batches, self.input_size]).astype(np.int8)
+        for input_sequence in input_sequences:
+            interpreter.set_tensor(input_layer["index"], input_sequence)
             interpreter.invoke()
-            svdf_ref = interpreter.get_tensor(output_layer["index"])
+        svdf_ref = interpreter.get_tensor(output_layer["index"])
         self.generate_c_array(self.output_data_file_prefix, svdf_ref)
 
         self.write_c_config_header()
@@ -1391,11 +1629,11 @@ class AddMulSettings(TestSettings):
         input_shape = (1, self.y_input, self.x_input, self.input_ch)
 
         input_data1 = self.get_randomized_data(list(input_shape),
-                                               self.inputs_table_file,
+                                               self.inputs_table,
                                                regenerate=self.regenerate_new_input,
                                                decimals=self.decimal_input)
         input_data2 = self.get_randomized_data(list(input_shape),
-                                               self.kernel_table_file,
+                                               self.kernel_table,
                                                regenerate=self.regenerate_new_weights,
                                                decimals=self.decimal_input)
 
@@ -1420,7 +1658,7 @@ class AddMulSettings(TestSettings):
 
         interpreter = self.convert_and_interpret(model, inttype_tf)
 
-        input_details = interpreter.get_input_details()
+        input_details = self.input_details
         interpreter.set_tensor(input_details[0]["index"], tf.cast(input_data1, inttype_tf))
         interpreter.set_tensor(input_details[1]["index"], tf.cast(input_data2, inttype_tf))
 
@@ -1430,23 +1668,23 @@ class AddMulSettings(TestSettings):
         self.input1_zero_point = -self.input1_zero_point
         self.input2_zero_point = -self.input2_zero_point
         double_max_input_scale = max(input1_scale, input2_scale) * 2
-        (self.input1_mult, self.input1_shift) = self.quantize_scale(input1_scale / double_max_input_scale)
-        (self.input2_mult, self.input2_shift) = self.quantize_scale(input2_scale / double_max_input_scale)
-
         if self.test_type == 'add':
             actual_output_scale = double_max_input_scale / ((1 << self.left_shift) * self.output_scale)
         elif self.test_type == 'mul':
             actual_output_scale = input1_scale * input2_scale / self.output_scale
-        (self.output_mult, self.output_shift) = self.quantize_scale(actual_output_scale)
+        multipliers, shifts = self.quantize_scales(
+            [input1_scale / double_max_input_scale, input2_scale / double_max_input_scale, actual_output_scale])
+        (self.input1_mult, self.input2_mult, self.output_mult) = multipliers
+        (self.input1_shift, self.input2_shift, self.output_shift) = shifts
 
         # Generate reference.
+        output_details = self.output_details
         interpreter.invoke()
-        output_details = interpreter.get_output_details()
         output_data = interpreter.get_tensor(output_details[0]["index"])
         self.generate_c_array("input1", input_data1, datatype=inttype)
         self.generate_c_array("input2", input_data2, datatype=inttype)
         self.generate_c_array(self.output_data_file_prefix,
-                              np.clip(output_data, self.out_activation_min, self.out_activation_max),
+                              np.clip(output_data, self.out_activation_min, self.out_activation_max, out=output_data),
                               datatype=inttype)
 
         self.write_c_config_header()
@@ -1455,30 +1693,32 @@ class AddMulSettings(TestSettings):
     def write_c_config_header(self) -> None:
         super().write_c_config_header(write_common_parameters=False)
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            f.write("#define {}_DST_SIZE {}\n".format(prefix,
-                                                      self.batches * self.y_input * self.x_input * self.input_ch))
-            f.write("#define {}_OUT_ACTIVATION_MIN {}\n".format(prefix, self.out_activation_min))
-            f.write("#define {}_OUT_ACTIVATION_MAX {}\n".format(prefix, self.out_activation_max))
-            f.write("#define {}_INPUT1_OFFSET {}\n".format(prefix, self.input1_zero_point))
-            f.write("#define {}_INPUT2_OFFSET {}\n".format(prefix, self.input2_zero_point))
-            f.write("#define {}_OUTPUT_MULT {}\n".format(prefix, self.output_mult))
-            f.write("#define {}_OUTPUT_SHIFT {}\n".format(prefix, self.output_shift))
-            f.write("#define {}_OUTPUT_OFFSET {}\n".format(prefix, self.output_zero_point))
-            if self.test_type == 'add':
-                f.write("#define {}_LEFT_SHIFT {}\n".format(prefix, self.left_shift))
-                f.write("#define {}_INPUT1_SHIFT {}\n".format(prefix, self.input1_shift))
-                f.write("#define {}_INPUT2_SHIFT {}\n".format(prefix, self.input2_shift))
-                f.write("#define {}_INPUT1_MULT {}\n".format(prefix, self.input1_mult))
-                f.write("#define {}_INPUT2_MULT {}\n".format(prefix, self.input2_mult))
+        defines = [
+            ("DST_SIZE", self.batches * self.y_input * self.x_input * self.input_ch),
+            ("OUT_ACTIVATION_MIN", self.out_activation_min),
+            ("OUT_ACTIVATION_MAX", self.out_activation_max),
+            ("INPUT1_OFFSET", self.input1_zero_point),
+            ("INPUT2_OFFSET", self.input2_zero_point),
+            ("OUTPUT_MULT", self.output_mult),
+            ("OUTPUT_SHIFT", self.output_shift),
+            ("OUTPUT_OFFSET", self.output_zero_point),
+        ]
+        if self.test_type == 'add':
+            defines += [
+                ("LEFT_SHIFT", self.left_shift),
+                ("INPUT1_SHIFT", self.input1_shift),
+                ("INPUT2_SHIFT", self.input2_shift),
+                ("INPUT1_MULT", self.input1_mult),
+                ("INPUT2_MULT", self.input2_mult),
+            ]
+        self.append_c_config_defines(defines)
 
 
 class LSTMSettings(TestSettings):
 
+    # Converting the LSTM model takes about ten times as long as for the other test types.
+    relative_generation_time = 10
+
     def __init__(self,
                  dataset,
                  testtype,
@@ -1518,15 +1758,13 @@ class LSTMSettings(TestSettings):
         self.number_units = number_units
         self.number_inputs = number_inputs
 
-        self.kernel_hidden_table_file = self.pregenerated_data_dir + self.testdataset + '/' + 'kernel_hidden.txt'
+        self.kernel_hidden_table = 'kernel_hidden'
 
         self.time_major = time_major
 
         self.in_activation_max = INT16_MAX
         self.in_activation_min = INT16_MIN
 
-        self.lstm_scales = []
-
         # Layer indexes. Works with tensorflow 2.10 and 2.11.
         self.output_gate_bias_index = 1
         self.cell_gate_bias_index = 2
@@ -1552,11 +1790,9 @@ class LSTMSettings(TestSettings):
 
         input_dims = [self.batches, self.time_steps, self.number_inputs]
         if input_data is not None:
-            input_data = tf.reshape(input_data, input_dims)
+            input_data = np.reshape(input_data, input_dims)
         else:
-            input_data = self.get_randomized_data(input_dims,
-                                                  self.inputs_table_file,
-                                                  regenerate=self.regenerate_new_input)
+            input_data = self.get_randomized_data(input_dims, self.inputs_table, regenerate=self.regenerate_new_input)
 
         # This will be the same size when there is no projection.
         number_cells = self.number_units
@@ -1565,31 +1801,31 @@ class LSTMSettings(TestSettings):
         number_w_b = 4
 
         if weights is not None:
-            weights = tf.reshape(weights, [self.number_inputs, number_cells * number_w_b])
+            weights = np.reshape(weights, [self.number_inputs, number_cells * number_w_b])
         else:
             weights = self.get_randomized_data([self.number_inputs, number_cells * number_w_b],
-                                               self.kernel_table_file,
+                                               self.kernel_table,
                                                regenerate=self.regenerate_new_weights,
                                                decimals=8,
                                                minrange=-1.0,
                                                maxrange=1.0)
 
         if hidden_weights is not None:
-            hidden_weights = tf.reshape(hidden_weights, [number_cells, number_cells * number_w_b])
+            hidden_weights = np.reshape(hidden_weights, [number_cells, number_cells * number_w_b])
         else:
             hidden_weights = self.get_randomized_data([number_cells, number_cells * number_w_b],
-                                                      self.kernel_hidden_table_file,
+                                                      self.kernel_hidden_table,
                                                       regenerate=self.regenerate_new_weights,
                                                       decimals=8,
                                                       minrange=-1.0,
                                                       maxrange=1.0)
         if not self.generate_bias:
-            biases = [0] * number_cells * number_w_b
-        if biases is not None:
-            biases = tf.reshape(biases, [number_cells * number_w_b])
+            biases = np.zeros(number_cells * number_w_b, dtype=np.float32)
+        elif biases is not None:
+            biases = np.reshape(biases, [number_cells * number_w_b])
         else:
             biases = self.get_randomized_data([number_cells * number_w_b],
-                                              self.bias_table_file,
+                                              self.bias_table,
                                               regenerate=self.regenerate_new_bias,
                                               decimals=8,
                                               minrange=-1.0,
@@ -1629,9 +1865,6 @@ class LSTMSettings(TestSettings):
 
         all_layers_details = interpreter.get_tensor_details()
 
-        for i in all_layers_details:
-            self.lstm_scales.append(i['quantization_parameters']['scales'])
-
         input_data_for_index = all_layers_details[0]
 
         input_gate_bias = all_layers_details[self.input_gate_bias_index + time_major_offset]
@@ -1664,46 +1897,52 @@ class LSTMSettings(TestSettings):
         effective_hidden_scale_intermediate = all_layers_details[self.effective_hidden_scale_intermediate_index +
                                                                  time_major_offset]
 
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-        actual_input_data = interpreter.get_tensor(input_details[0]["index"])
-        if (input_data.numpy().shape != actual_input_data.shape) or \
-           not ((input_data.numpy().astype(int) == actual_input_data).all().astype(int)):
+        # Each tensor is copied out of the interpreter once, even if it is used for several headers.
+        tensor_data = {}
+
+        def get_tensor(tensor_details):
+            index = tensor_details['index']
+            if index not in tensor_data:
+                tensor_data[index] = interpreter.get_tensor(index)
+            return tensor_data[index]
+
+        input_details = self.input_details
+        output_details = self.output_details
+        actual_input_data = get_tensor(input_details[0])
+        if not np.array_equal(np.asarray(input_data).astype(int), actual_input_data):
             raise RuntimeError("Input data mismatch")
 
-        self.generate_c_array(self.input_data_file_prefix, interpreter.get_tensor(input_data_for_index['index']))
-        self.generate_c_array("input_to_input_w", interpreter.get_tensor(input_to_input_w['index']))
-        self.generate_c_array("input_to_forget_w", interpreter.get_tensor(input_to_forget_w['index']))
-        self.generate_c_array("input_to_cell_w", interpreter.get_tensor(input_to_cell_w['index']))
-        self.generate_c_array("input_to_output_w", interpreter.get_tensor(input_to_output_w['index']))
-        self.generate_c_array("recurrent_input_to_input_w", interpreter.get_tensor(recurrent_input_to_input_w['index']))
-        self.generate_c_array("recurrent_input_to_forget_w",
-                              interpreter.get_tensor(recurrent_input_to_forget_w['index']))
-        self.generate_c_array("recurrent_input_to_cell_w", interpreter.get_tensor(recurrent_input_to_cell_w['index']))
-        self.generate_c_array("recurrent_input_to_output_w",
-                              interpreter.get_tensor(recurrent_input_to_output_w['index']))
+        self.generate_c_array(self.input_data_file_prefix, get_tensor(input_data_for_index))
+        self.generate_c_array("input_to_input_w", get_tensor(input_to_input_w))
+        self.generate_c_array("input_to_forget_w", get_tensor(input_to_forget_w))
+        self.generate_c_array("input_to_cell_w", get_tensor(input_to_cell_w))
+        self.generate_c_array("input_to_output_w", get_tensor(input_to_output_w))
+        self.generate_c_array("recurrent_input_to_input_w", get_tensor(recurrent_input_to_input_w))
+        self.generate_c_array("recurrent_input_to_forget_w", get_tensor(recurrent_input_to_forget_w))
+        self.generate_c_array("recurrent_input_to_cell_w", get_tensor(recurrent_input_to_cell_w))
+        self.generate_c_array("recurrent_input_to_output_w", get_tensor(recurrent_input_to_output_w))
 
         # Peephole not supported so these are nullptrs.
         self.generate_c_array("cell_to_input", [], datatype='int16_t')
         self.generate_c_array("cell_to_forget", [], datatype='int16_t')
         self.generate_c_array("cell_to_output", [], datatype='int16_t')
 
-        self.generate_c_array("input_gate_bias", interpreter.get_tensor(input_gate_bias['index']), datatype='int32_t')
-        self.generate_c_array("cell_gate_bias", interpreter.get_tensor(cell_gate_bias['index']), datatype='int32_t')
-        self.generate_c_array("forget_gate_bias", interpreter.get_tensor(forget_gate_bias['index']), datatype='int32_t')
-        self.generate_c_array("output_gate_bias", interpreter.get_tensor(output_gate_bias['index']), datatype='int32_t')
+        self.generate_c_array("input_gate_bias", get_tensor(input_gate_bias), datatype='int32_t')
+        self.generate_c_array("cell_gate_bias", get_tensor(cell_gate_bias), datatype='int32_t')
+        self.generate_c_array("forget_gate_bias", get_tensor(forget_gate_bias), datatype='int32_t')
+        self.generate_c_array("output_gate_bias", get_tensor(output_gate_bias), datatype='int32_t')
 
         # Projection not supported so these are nullptrs.
         self.generate_c_array("projection_weights", [])
         self.generate_c_array("projection_bias", [], datatype='int32_t')
 
-        self.generate_c_array("output_state", interpreter.get_tensor(output_state['index']), const="")
-        self.generate_c_array("cell_state", interpreter.get_tensor(cell_state['index']), datatype='int16_t', const="")
+        self.generate_c_array("output_state", get_tensor(output_state), const="")
+        self.generate_c_array("cell_state", get_tensor(cell_state), datatype='int16_t', const="")
 
-        self.generate_c_array("input_norm_coeff", interpreter.get_tensor(input_norm_coeff['index']))
-        self.generate_c_array("forget_norm_coeff", interpreter.get_tensor(forget_norm_coeff['index']))
-        self.generate_c_array("cell_norm_coeff", interpreter.get_tensor(cell_norm_coeff['index']))
-        self.generate_c_array("output_norm_coeff", interpreter.get_tensor(output_norm_coeff['index']))
+        self.generate_c_array("input_norm_coeff", get_tensor(input_norm_coeff))
+        self.generate_c_array("forget_norm_coeff", get_tensor(forget_norm_coeff))
+        self.generate_c_array("cell_norm_coeff", get_tensor(cell_norm_coeff))
+        self.generate_c_array("output_norm_coeff", get_tensor(output_norm_coeff))
 
         input_scale = input_data_for_index['quantization_parameters']['scales'][0]
         cell_scale = cell_state['quantization_parameters']['scales'][0]
@@ -1714,28 +1953,34 @@ class LSTMSettings(TestSettings):
         self.hidden_zp = effective_hidden_scale_intermediate['quantization_parameters']['zero_points'][0]
         self.output_state_offset = output_state_zp
 
-        tmp = math.log(cell_scale) * (1 / math.log(2))
-        self.cell_state_shift = int(round(tmp))
+        self.cell_state_shift = int(round(math.log2(cell_scale)))
 
-        self.calc_scales(input_scale, output_state_scale)
+        input_weights = [input_to_input_w, input_to_forget_w, input_to_cell_w, input_to_output_w]
+        recurrent_weights = [
+            recurrent_input_to_input_w, recurrent_input_to_forget_w, recurrent_input_to_cell_w,
+            recurrent_input_to_output_w
+        ]
+        self.calc_scales(input_scale, output_state_scale, input_weights, recurrent_weights)
 
         # Calculate effective biases.
         input_zp = -input_zp
         output_zp = -output_zp
         output_state_zp = -output_state_zp
-        input_to_forget_eff_bias = self.calc_effective_bias(interpreter, input_zp, input_to_forget_w, forget_gate_bias)
-        recurrent_to_forget_eff_bias = self.calc_effective_bias(interpreter, output_state_zp,
-                                                                recurrent_input_to_forget_w, None, False)
-        input_to_cell_eff_bias = self.calc_effective_bias(interpreter, input_zp, input_to_cell_w, cell_gate_bias)
-        recurrent_to_cell_eff_bias = self.calc_effective_bias(interpreter, output_state_zp, recurrent_input_to_cell_w,
-                                                              None, False)
-        input_to_output_eff_bias = self.calc_effective_bias(interpreter, input_zp, input_to_output_w, output_gate_bias)
-        recurrent_to_output_eff_bias = self.calc_effective_bias(interpreter, output_state_zp,
-                                                                recurrent_input_to_output_w, None, False)
-        input_to_input_eff_bias = self.calc_effective_bias(interpreter, input_zp, input_to_input_w, input_gate_bias)
-
-        recurrent_to_input_eff_bias = self.calc_effective_bias(interpreter, output_state_zp, recurrent_input_to_input_w,
-                                                               None, False)
+        input_to_forget_eff_bias = self.calc_effective_bias(input_zp, get_tensor(input_to_forget_w),
+                                                            get_tensor(forget_gate_bias))
+        recurrent_to_forget_eff_bias = self.calc_effective_bias(output_state_zp,
+                                                                get_tensor(recurrent_input_to_forget_w))
+        input_to_cell_eff_bias = self.calc_effective_bias(input_zp, get_tensor(input_to_cell_w),
+                                                          get_tensor(cell_gate_bias))
+        recurrent_to_cell_eff_bias = self.calc_effective_bias(output_state_zp, get_tensor(recurrent_input_to_cell_w))
+        input_to_output_eff_bias = self.calc_effective_bias(input_zp, get_tensor(input_to_output_w),
+                                                            get_tensor(output_gate_bias))
+        recurrent_to_output_eff_bias = self.calc_effective_bias(output_state_zp,
+                                                                get_tensor(recurrent_input_to_output_w))
+        input_to_input_eff_bias = self.calc_effective_bias(input_zp, get_tensor(input_to_input_w),
+                                                           get_tensor(input_gate_bias))
+
+        recurrent_to_input_eff_bias = self.calc_effective_bias(output_state_zp, get_tensor(recurrent_input_to_input_w))
 
         self.generate_c_array("input_to_input_eff_bias", input_to_input_eff_bias, datatype='int32_t')
         self.generate_c_array("input_to_forget_eff_bias", input_to_forget_eff_bias, datatype='int32_t')
@@ -1754,112 +1999,85 @@ class LSTMSettings(TestSettings):
         self.write_c_config_header()
         self.write_c_header_wrapper()
 
-    def calc_scales(self, input_scale, output_state_scale):
+    def calc_scales(self, input_scale, output_state_scale, input_weights, recurrent_weights):
+        """
+        The weights are the tensor details of the input and recurrent weights, for the input, forget, cell and output
+        gates in that order.
+        """
         intermediate_scale = pow(2, -12)
 
-        if self.time_major:
-            time_major_offset = 1
-        else:
-            time_major_offset = 0
-
         self.effective_hidden_scale = pow(2, -15) / output_state_scale * pow(2, -15)
 
-        self.i2i_effective_scale = input_scale * self.lstm_scales[self.input_to_input_w_index + time_major_offset][0] \
-            / intermediate_scale
-        self.i2f_effective_scale = input_scale * self.lstm_scales[self.input_to_forget_w_index + time_major_offset][0] \
-            / intermediate_scale
-        self.i2c_effective_scale = input_scale * self.lstm_scales[self.input_to_cell_w_index + time_major_offset][0] \
-            / intermediate_scale
-        self.i2o_effective_scale = input_scale * self.lstm_scales[self.input_to_output_w_index + time_major_offset][0] \
-            / intermediate_scale
-
-        self.r2i_effective_scale = output_state_scale * self.lstm_scales[self.recurrent_input_to_input_w_index +
-                                                                         time_major_offset][0] / intermediate_scale
-        self.r2f_effective_scale = output_state_scale * self.lstm_scales[self.recurrent_input_to_forget_w_index +
-                                                                         time_major_offset][0] / intermediate_scale
-        self.r2c_effective_scale = output_state_scale * self.lstm_scales[self.recurrent_input_to_cell_w_index +
-                                                                         time_major_offset][0] / intermediate_scale
-        self.r2o_effective_scale = output_state_scale * self.lstm_scales[self.recurrent_input_to_output_w_index +
-                                                                         time_major_offset][0] / intermediate_scale
-
-    def calc_effective_bias(self, interpreter, zero_point, weight_tensor, bias_tensor, has_bias=True) -> list:
-
-        weights = interpreter.get_tensor(weight_tensor['index'])
-        dims = weight_tensor['shape']
-        row = dims[0]
-        col = dims[1]
-
-        if has_bias:
-            bias_data = interpreter.get_tensor(bias_tensor['index'])
-            output = bias_data
-        else:
-            output = np.zeros((row, ), dtype=np.int32)
+        input_weights_scales = [weights['quantization_parameters']['scales'][0] for weights in input_weights]
+        recurrent_weights_scales = [weights['quantization_parameters']['scales'][0] for weights in recurrent_weights]
+
+        self.i2i_effective_scale = input_scale * input_weights_scales[0] / intermediate_scale
+        self.i2f_effective_scale = input_scale * input_weights_scales[1] / intermediate_scale
+        self.i2c_effective_scale = input_scale * input_weights_scales[2] / intermediate_scale
+        self.i2o_effective_scale = input_scale * input_weights_scales[3] / intermediate_scale
 
-        for i_row in range(row):
-            row_sum = 0
-            for i_col in range(col):
-                row_sum = row_sum + weights[i_row][i_col]
-            output[i_row] = output[i_row] + row_sum * zero_point
+        self.r2i_effective_scale = output_state_scale * recurrent_weights_scales[0] / intermediate_scale
+        self.r2f_effective_scale = output_state_scale * recurrent_weights_scales[1] / intermediate_scale
+        self.r2c_effective_scale = output_state_scale * recurrent_weights_scales[2] / intermediate_scale
+        self.r2o_effective_scale = output_state_scale * recurrent_weights_scales[3] / intermediate_scale
 
-        return output
+    def calc_effective_bias(self, zero_point, weights, bias=None) -> np.ndarray:
+        row_sums = np.sum(weights, axis=1, dtype=np.int64)
+        if bias is None:
+            return (row_sums * zero_point).astype(np.int32)
+        return (bias + row_sums * zero_point).astype(np.int32)
 
     def write_c_config_header(self) -> None:
         super().write_c_config_header(write_common_parameters=False)
 
-        filename = self.config_data
-        filepath = self.headers_dir + filename
-        prefix = self.testdataset.upper()
-
-        with open(filepath, "a") as f:
-            f.write("#define {}_BUFFER_SIZE {}\n".format(prefix, self.batches * self.number_units))
-            f.write("#define {}_INPUT_BATCHES {}\n".format(prefix, self.batches))
-            f.write("#define {}_DST_SIZE {}\n".format(prefix, self.batches * self.time_steps * self.number_units))
-            f.write("#define {}_TIME_STEPS {}\n".format(prefix, self.time_steps))
-            f.write("#define {}_NUMBER_UNITS {}\n".format(prefix, self.number_units))
-            f.write("#define {}_NUMBER_INPUTS {}\n".format(prefix, self.number_inputs))
-            f.write("#define {}_TIME_MAJOR {}\n".format(prefix, int(self.time_major)))
-            f.write("#define {}_IN_ACTIVATION_MIN {}\n".format(prefix, self.in_activation_min))
-            f.write("#define {}_IN_ACTIVATION_MAX {}\n".format(prefix, self.in_activation_max))
-
-            (multiplier, shift) = self.quantize_scale(self.i2i_effective_scale)
-            f.write("#define {}_IN_TO_INPUT_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_IN_TO_INPUT_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.i2f_effective_scale)
-            f.write("#define {}_IN_TO_FORGET_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_IN_TO_FORGET_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.i2c_effective_scale)
-            f.write("#define {}_IN_TO_CELL_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_IN_TO_CELL_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.i2o_effective_scale)
-            f.write("#define {}_IN_TO_OUTPUT_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_IN_TO_OUTPUT_SHIFT {}\n".format(prefix, shift))
-
-            (multiplier, shift) = self.quantize_scale(self.r2i_effective_scale)
-            f.write("#define {}_RECURRENT_TO_INPUT_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_RECURRENT_TO_INPUT_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.r2f_effective_scale)
-            f.write("#define {}_RECURRENT_TO_FORGET_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_RECURRENT_TO_FORGET_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.r2c_effective_scale)
-            f.write("#define {}_RECURRENT_TO_CELL_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_RECURRENT_TO_CELL_SHIFT {}\n".format(prefix, shift))
-            (multiplier, shift) = self.quantize_scale(self.r2o_effective_scale)
-            f.write("#define {}_RECURRENT_TO_OUTPUT_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_RECURRENT_TO_OUTPUT_SHIFT {}\n".format(prefix, shift))
-
-            (multiplier, shift) = self.quantize_scale(self.effective_hidden_scale)
-            f.write("#define {}_HIDDEN_MULTIPLIER {}\n".format(prefix, multiplier))
-            f.write("#define {}_HIDDEN_SHIFT {}\n".format(prefix, shift))
-
-            f.write("#define {}_HIDDEN_OFFSET {}\n".format(prefix, self.hidden_zp))
-
-            f.write("#define {}_OUTPUT_STATE_OFFSET {}\n".format(prefix, self.output_state_offset))
-            f.write("#define {}_CELL_STATE_SHIFT {}\n".format(prefix, self.cell_state_shift))
-
-            for i in range(len(self.lstm_scales)):
-                if len(self.lstm_scales[i]) == 0:
-                    continue
-                (multiplier, shift) = self.quantize_scale(self.lstm_scales[i][0])
+        defines = [
+            ("BUFFER_SIZE", self.batches * self.number_units),
+            ("INPUT_BATCHES", self.batches),
+            ("DST_SIZE", self.batches * self.time_steps * self.number_units),
+            ("TIME_STEPS", self.time_steps),
+            ("NUMBER_UNITS", self.number_units),
+            ("NUMBER_INPUTS", self.number_inputs),
+            ("TIME_MAJOR", int(self.time_major)),
+            ("IN_ACTIVATION_MIN", self.in_activation_min),
+            ("IN_ACTIVATION_MAX", self.in_activation_max),
+        ]
+
+        scales = [
+            ("IN_TO_INPUT", self.i2i_effective_scale),
+            ("IN_TO_FORGET", self.i2f_effective_scale),
+            ("IN_TO_CELL", self.i2c_effective_scale),
+            ("IN_TO_OUTPUT", self.i2o_effective_scale),
+            ("RECURRENT_TO_INPUT", self.r2i_effective_scale),
+            ("RECURRENT_TO_FORGET", self.r2f_effective_scale),
+            ("RECURRENT_TO_CELL", self.r2c_effective_scale),
+            ("RECURRENT_TO_OUTPUT", self.r2o_effective_scale),
+            ("HIDDEN", self.effective_hidden_scale),
+        ]
+        multipliers, shifts = self.quantize_scales([scale for _, scale in scales])
+        for (name, _), multiplier, shift in zip(scales, multipliers, shifts):
+            defines += [(name + "_MULTIPLIER", multiplier), (name + "_SHIFT", shift)]
+
+        defines += [
+            ("HIDDEN_OFFSET", self.hidden_zp),
+            ("OUTPUT_STATE_OFFSET", self.output_state_offset),
+            ("CELL_STATE_SHIFT", self.cell_state_shift),
+        ]
+        self.append_c_config_defines(defines)
+
+
+# Settings class of each test type, used for test sets that are not in load_testdata_sets().
+settings_classes = {
+    'conv': ConvSettings,
+    'depthwise_conv': ConvSettings,
+    'fully_connected': FullyConnectedSettings,
+    'avgpool': PoolingSettings,
+    'maxpool': PoolingSettings,
+    'softmax': SoftmaxSettings,
+    'svdf': SVDFSettings,
+    'add': AddMulSettings,
+    'mul': AddMulSettings,
+    'lstm': LSTMSettings,
+}
 
 
 def load_testdata_sets() -> dict:
@@ -2751,8 +2969,6 @@ def load_testdata_sets() -> dict:
                                           generate_bias=False)
 
     dataset = 'dw_int16xint8_fast_test_bias'
-    nbr_of_out_channels = 8
-    bias = [i for i in range(nbr_of_out_channels)]
     testdata_sets[dataset] = ConvSettings(dataset,
                                           type_of_test,
                                           regenerate_weights,
@@ -2760,7 +2976,7 @@ def load_testdata_sets() -> dict:
                                           regenerate_biases,
                                           schema_file,
                                           in_ch=8,
-                                          out_ch=nbr_of_out_channels,
+                                          out_ch=8,
                                           x_in=4,
                                           y_in=4,
                                           w_x=2,
@@ -2773,7 +2989,7 @@ def load_testdata_sets() -> dict:
                                           out_activation_min=-17000,
                                           out_activation_max=32767,
                                           int16xint8=True,
-                                          generate_bias=bias)
+                                          generate_bias=True)
 
     dataset = 'dw_int16xint8_fast_null_bias'
     testdata_sets[dataset] = ConvSettings(dataset,
@@ -3559,11 +3775,17 @@ def load_testdata_sets() -> dict:
     return testdata_sets
 
 
-if __name__ == '__main__':
-    if version.parse(tf.__version__) < REQUIRED_MINIMUM_TENSORFLOW_VERSION:
-        print("Unsupported tensorflow version, ", version.parse(tf.__version__))
-        sys.exit(0)
+def generate_testset(testset_generator) -> None:
+    """
+    Worker function for generating test sets in parallel.
+    """
+    try:
+        testset_generator.generate_data_if_outdated()
+    finally:
+        TestSettings.flush_formatting()
 
+
+if __name__ == '__main__':
     args = parse_args()
 
     testdataset = args.dataset
@@ -3573,42 +3795,54 @@ if __name__ == '__main__':
     testdata_sets = load_testdata_sets()
 
     if args.run_all_testsets:
-        for testset_name, testset_generator in testdata_sets.items():
-            if test_type and testset_generator.test_type != test_type:
-                continue
-            print("Generating testset {}..".format(testset_name))
-            testset_generator.generate_data()
-            print()
+        selected_testsets = {
+            testset_name: testset_generator
+            for testset_name, testset_generator in testdata_sets.items()
+            if not test_type or testset_generator.test_type == test_type
+        }
+        if args.jobs > 1:
+            # Test sets are independent of each other, so they can be generated in separate processes. Only the
+            # workers import tensorflow. They are spawned rather than forked, and each of them is kept single threaded
+            # so they do not compete for cores.
+            os.environ['OMP_NUM_THREADS'] = '1'
+            os.environ['TF_NUM_INTRAOP_THREADS'] = '1'
+            os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+            slowest_first = sorted(selected_testsets.items(), key=lambda item: -item[1].relative_generation_time)
+            with ProcessPoolExecutor(max_workers=args.jobs,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = {
+                    executor.submit(generate_testset, testset_generator): testset_name
+                    for testset_name, testset_generator in slowest_first
+                }
+                for future in as_completed(futures):
+                    future.result()
+                    print("Generated testset {}".format(futures[future]))
+        else:
+            try:
+                for testset_name, testset_generator in selected_testsets.items():
+                    print("Generating testset {}..".format(testset_name))
+                    testset_generator.generate_data_if_outdated()
+                    print()
+            finally:
+                TestSettings.flush_formatting()
 
         # Check that all testsets have been loaded.
-        found_test_data_sets = []
         directory = 'TestCases/TestData'
-        for dir in next(os.walk(directory))[1]:
-            found_test_data_sets.append(dir)
-        for testset_name in found_test_data_sets:
-            if testset_name not in testdata_sets:
-                print("WARNING: Testset {} in {} was not loaded".format(testset_name, directory))
+        with os.scandir(directory) as entries:
+            found_test_data_sets = {entry.name for entry in entries if entry.is_dir()}
+        for testset_name in sorted(found_test_data_sets - testdata_sets.keys()):
+            print("WARNING: Testset {} in {} was not loaded".format(testset_name, directory))
     elif testdataset:
-        try:
-            generator = testdata_sets[testdataset]
-        except KeyError:
+        generator = testdata_sets.get(testdataset)
+        if generator is None:
             print("WARNING: testset {} not in testset list".format(testdataset))
-            if test_type == 'conv' or test_type == 'depthwise_conv':
-                generator = ConvSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'fully_connected':
-                generator = FullyConnectedSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'avgpool' or test_type == 'maxpool':
-                generator = PoolingSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'softmax':
-                generator = SoftmaxSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'svdf':
-                generator = SVDFSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'add' or test_type == 'mul':
-                generator = AddMulSettings(testdataset, test_type, True, True, True, schema_file)
-            elif test_type == 'lstm':
-                generator = LSTMSettings(testdataset, test_type, True, True, True, schema_file)
-            else:
+            settings_class = settings_classes.get(test_type)
+            if settings_class is None:
                 raise RuntimeError("Please specify type of test with -t")
-        generator.generate_data()
+            generator = settings_class(testdataset, test_type, True, True, True, schema_file)
+        try:
+            generator.generate_data_if_outdated()
+        finally:
+            TestSettings.flush_formatting()
     else:
         raise RuntimeError("Please select testdataset or use --run-all-testsets")
@@ -25,7 +25,8 @@ import subprocess
 import numpy as np
 import tensorflow as tf
 
-from generate_test_data import SoftmaxSettings, FullyConnectedSettings, ConvSettings, Interpreter, OpResolverType
+import generate_test_data
+from generate_test_data import TestSettings, SoftmaxSettings, FullyConnectedSettings, ConvSettings
 
 
 class MODEL_EXTRACTOR(SoftmaxSettings, FullyConnectedSettings, ConvSettings):
@@ -276,8 +277,11 @@ class MODEL_EXTRACTOR(SoftmaxSettings, FullyConnectedSettings, ConvSettings):
 
     def generate_data(self, input_data=None, weights=None, biases=None) -> None:
 
-        interpreter = Interpreter(model_path=str(self.tflite_model),
-                                  experimental_op_resolver_type=OpResolverType.BUILTIN_REF)
+        # The interpreter is imported by generate_test_data together with tensorflow.
+        generate_test_data.import_tensorflow()
+        interpreter = generate_test_data.Interpreter(
+            model_path=str(self.tflite_model),
+            experimental_op_resolver_type=generate_test_data.OpResolverType.BUILTIN_REF)
         interpreter.allocate_tensors()
 
         # Needed for input/output scale/zp as equivalant json file data has too low precision.
@@ -325,4 +329,7 @@ if __name__ == '__main__':
         dataset, _ = os.path.splitext(os.path.basename(tflite_model))
 
     model_extractor = MODEL_EXTRACTOR(dataset, schema_file, tflite_model)
-    model_extractor.generate_data()
+    try:
+        model_extractor.generate_data()
+    finally:
+        TestSettings.flush_formatting()